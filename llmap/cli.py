@@ -54,16 +54,17 @@ def init(force: bool):
 @main.command()
 @click.option("--full", is_flag=True, help="Force full rebuild (ignore cache)")
 @click.option("--dry-run", is_flag=True, help="Show what would be updated without doing it")
-def update(full: bool, dry_run: bool):
+@click.option("--clean-cache", is_flag=True, help="Discard cached LLM summaries before updating")
+def update(full: bool, dry_run: bool, clean_cache: bool):
     """Update the code map (incrementally by default)."""
+    import asyncio
+    
     from .config import load_config, ConfigError
-    from .state import StateManager
+    from .state import StateManager, StateError
     from .detector import ChangeDetector
     from .modules import ModuleGrouper, DependencyResolver
     from .generator import MapGenerator
     
-    _setup_litellm()  # Suppress litellm noise before generator uses it
-    
     codemap_path = Path(CODEMAP_DIR)
     
     if not codemap_path.exists():
@@ -76,10 +77,16 @@ def update(full: bool, dry_run: bool):
         click.echo(f"Error: {e}")
         raise SystemExit(1)
     
-    state = StateManager(codemap_path / "state.json")
-    detector = ChangeDetector(config, state)
+    try:
+        state = StateManager(codemap_path)
+    except StateError as e:
+        click.echo(f"Error: {e}")
+        raise SystemExit(1)
+    detector = ChangeDetector(config, state, keep_sources=True)
     grouper = ModuleGrouper(config)
-    generator = MapGenerator(config, codemap_path)
+    generator = MapGenerator(
+        config, codemap_path, sources=detector.sources, refresh_cache=full
+    )
     
     # Detect changes
     if full:
@@ -88,63 +95,87 @@ def update(full: bool, dry_run: bool):
     else:
         changed_files = detector.get_changed_files()
         if not changed_files:
+            # Persist refreshed signatures of touched-but-identical files
+            state.save()
             click.echo("✓ Code map is up-to-date")
             return
     
     # Group into modules
     modules = grouper.group_files(changed_files)
     
+    # Skip modules whose docs were already generated from identical sources,
+    # unless a full rebuild was asked for (e.g. after changing the model)
+    stale_modules = [
+        module for module in modules
+        if full or not generator.is_up_to_date(module, state.get_module_hash(module.name))
+    ]
+    
     if dry_run:
         click.echo("Would update the following modules:")
-        for module in modules:
+        for module in stale_modules:
             click.echo(f"  - {module.name} ({len(module.files)} files)")
         return
     
-    # Generate maps and collect structures for dependency analysis
-    click.echo(f"Updating {len(modules)} module(s)...")
-    module_structures: dict[str, list] = {}
+    # Update state - build list of (filepath, hash, module_name) tuples
+    root = Path.cwd()
+    file_updates = []
     for module in modules:
-        click.echo(f"  → {module.name}")
-        _, structures = generator.generate_module(module)
-        module_structures[module.name] = structures
+        for path, file_hash in module.files:
+            rel_path = str(path.relative_to(root))
+            file_updates.append((rel_path, file_hash, module.name))
+    
+    if not stale_modules:
+        state.update(file_updates, detector.file_stats)
+        state.save()
+        click.echo("✓ Code map is up-to-date")
+        return
+    
+    if clean_cache:
+        generator.summary_cache.clear()
+    
+    _setup_litellm()  # Suppress litellm noise before generator uses it
+    
+    # Generate maps and collect structures for dependency analysis
+    click.echo(f"Updating {len(stale_modules)} module(s)...")
+    with generator:
+        module_structures = asyncio.run(generator.generate_modules(
+            stale_modules,
+            config.llm.concurrency,
+            on_done=lambda module: click.echo(f"  → {module.name}"),
+        ))
     
     # Build dependency graph using all known files (not just changed ones)
     click.echo("  → Resolving dependencies...")
-    root = Path.cwd()
     all_files = {filepath: fs.module for filepath, fs in state.state.files.items()}
     # Also add files from current update (in case they're new)
-    for module in modules:
-        for path, _ in module.files:
-            rel_path = str(path.relative_to(root))
-            all_files[rel_path] = module.name
-    resolver = DependencyResolver(modules, all_files)
+    for rel_path, _, module_name in file_updates:
+        all_files[rel_path] = module_name
+    resolver = DependencyResolver(stale_modules, all_files)
     resolver.build_dependency_graph(module_structures)
     
     # Add Related Modules sections to all generated files
-    for module in modules:
+    for module in stale_modules:
         generator.add_related_modules_section(module)
     
-    # Generate overview index
-    generator.generate_overview()
-    click.echo("  → overview.md")
+    state.update(file_updates, detector.file_stats)
     
-    # Update state - build list of (filepath, hash, module_name) tuples
-    file_updates = []
-    for module in modules:
-        for path, file_hash in module.files:
-            rel_path = str(path.relative_to(root))
-            file_updates.append((rel_path, file_hash, module.name))
+    # Generate overview index (caches parsed module metadata in state)
+    generator.generate_overview(state)
+    click.echo("  → overview.md")
     
-    state.update(file_updates)
     state.save()
     
-    click.echo(f"✓ Updated {len(modules)} module(s)")
+    click.echo(f"✓ Updated {len(stale_modules)} module(s)")
 
 
 @main.command()
 @click.option("--yes", "-y", is_flag=True, help="Skip confirmation prompt")
 def clean(yes: bool):
     """Erase the codemap and state, keeping the config."""
+    import shutil
+    from .state import STATE_FILES
+    from .summary_cache import CACHE_DIR
+    
     codemap_path = Path(CODEMAP_DIR)
     
     if not codemap_path.exists():
@@ -152,19 +183,23 @@ def clean(yes: bool):
         return
     
     # Files/dirs to remove (keeping config.yaml)
-    state_file = codemap_path / "state.json"
     modules_dir = codemap_path / "modules"
     overview_file = codemap_path / "overview.md"
+    cache_dir = codemap_path / CACHE_DIR
     
     items_to_remove = []
-    if state_file.exists():
-        items_to_remove.append(("file", state_file))
+    for state_name in STATE_FILES.values():
+        state_file = codemap_path / state_name
+        if state_file.exists():
+            items_to_remove.append(("file", state_file))
     if overview_file.exists():
         items_to_remove.append(("file", overview_file))
     if modules_dir.exists():
         module_files = list(modules_dir.glob("*.md"))
         for f in module_files:
             items_to_remove.append(("file", f))
+    if cache_dir.exists():
+        items_to_remove.append(("dir", cache_dir))
     
     if not items_to_remove:
         click.echo("✓ Nothing to clean (config preserved)")
@@ -180,7 +215,10 @@ def clean(yes: bool):
     
     # Remove items
     for item_type, item_path in items_to_remove:
-        item_path.unlink()
+        if item_type == "dir":
+            shutil.rmtree(item_path)
+        else:
+            item_path.unlink()
     
     click.echo(f"✓ Cleaned {len(items_to_remove)} item(s) (config preserved)")
 
@@ -189,7 +227,7 @@ def clean(yes: bool):
 def status():
     """Check if the code map is up-to-date."""
     from .config import load_config, ConfigError
-    from .state import StateManager
+    from .state import StateManager, StateError
     from .detector import ChangeDetector
     
     codemap_path = Path(CODEMAP_DIR)
@@ -204,7 +242,11 @@ def status():
         click.echo(f"Error: {e}")
         raise SystemExit(1)
     
-    state = StateManager(codemap_path / "state.json")
+    try:
+        state = StateManager(codemap_path)
+    except StateError as e:
+        click.echo(f"Error: {e}")
+        raise SystemExit(1)
     detector = ChangeDetector(config, state)
     
     changed_files = detector.get_changed_files()
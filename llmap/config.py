@@ -1,9 +1,9 @@
 """Configuration loading and validation."""
 
+import functools
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Optional
-import yaml
 
 
 class ConfigError(Exception):
@@ -16,6 +16,8 @@ class LLMConfig:
     provider: str = "anthropic"
     model: str = "claude-sonnet-4-20250514"
     api_base: Optional[str] = None  # Custom API base URL (e.g., for Ollama on WSL2)
+    concurrency: int = 8  # Max modules summarized in parallel
+    batch_tokens: int = 6000  # Token budget for packing small modules into one request (0 disables)
 
 
 @dataclass
@@ -52,10 +54,24 @@ class Config:
 
 
 def load_config(path: Path) -> Config:
-    """Load configuration from YAML file."""
-    if not path.exists():
+    """Load configuration from YAML file.
+    
+    Parsed configs are cached per (path, mtime), so repeated loads of an
+    unchanged file skip YAML parsing. Treat the returned Config as read-only.
+    """
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
         raise ConfigError(f"Config file not found: {path}")
     
+    return _load_config_cached(path.resolve(), mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_config_cached(path: Path, mtime_ns: int) -> Config:
+    """Parse a config file; mtime_ns is part of the cache key only."""
+    import yaml
+    
     try:
         with open(path) as f:
             data = yaml.safe_load(f) or {}
@@ -69,6 +85,8 @@ def load_config(path: Path) -> Config:
             provider=data["llm"].get("provider", config.llm.provider),
             model=data["llm"].get("model", config.llm.model),
             api_base=data["llm"].get("api_base"),
+            concurrency=data["llm"].get("concurrency", config.llm.concurrency),
+            batch_tokens=data["llm"].get("batch_tokens", config.llm.batch_tokens),
         )
     
     if "include" in data:
@@ -102,6 +120,8 @@ llm:
   provider: anthropic  # Options: anthropic, openai, gemini, ollama
   model: claude-sonnet-4-20250514
   # API key read from environment: ANTHROPIC_API_KEY, OPENAI_API_KEY, GEMINI_API_KEY, etc.
+  concurrency: 8  # Max modules summarized in parallel (lower if rate-limited)
+  batch_tokens: 6000  # Prompt budget for summarizing small modules together (0 = one per request)
 
 # What files to analyze
 include:
@@ -1,84 +1,256 @@
 """Change detection using content hashing."""
 
-import hashlib
-from fnmatch import fnmatch
+import os
+import re
+import stat
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from .config import Config
+from .hashing import hash_bytes, hash_file
 from .state import StateManager
 
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Limits for file contents kept in memory for the parsers (keep_sources)
+_MAX_KEPT_FILE_SIZE = 1 << 20  # 1 MiB
+_MAX_KEPT_TOTAL_SIZE = 64 << 20  # 64 MiB
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate a path glob into a regular expression (without anchors).
+    
+    `**/` matches zero or more leading directories and any other `**`
+    matches anything. In patterns containing a `/`, `*` and `?` never match
+    across a `/`; in patterns without one they do, as with fnmatch, so
+    `*.cpp` matches .cpp files at any depth.
+    """
+    # Characters `*` and `?` may match
+    any_char = "." if "/" not in pattern else "[^/]"
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append(any_char + "*")
+        elif c == "?":
+            out.append(any_char)
+        elif c == "[" and "]" in pattern[i + 2:]:
+            j = pattern.index("]", i + 2)
+            body = pattern[i + 1:j].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = j + 1
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def _compile_globs(patterns: list[str]) -> re.Pattern:
+    """Compile glob patterns into a single alternation regex."""
+    if not patterns:
+        return re.compile(r"(?!)")  # Never matches
+    return re.compile("|".join(f"(?:{_glob_to_regex(p)})" for p in patterns))
+
+
+class _HyperscanMatcher:
+    """Include/exclude matcher backed by a single Hyperscan database.
+    
+    All patterns are compiled into one multi-pattern DFA, so each path is
+    scanned once regardless of how many patterns are configured.
+    """
+    
+    def __init__(self, include: list[str], exclude: list[str]):
+        expressions = [
+            f"^(?:{_glob_to_regex(p)})$".encode() for p in [*include, *exclude]
+        ]
+        # Pattern ids below this are includes, the rest are excludes
+        self._num_include = len(include)
+        self._db = hyperscan.Database()
+        self._db.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(expressions),
+        )
+    
+    def should_include(self, rel_path: str) -> bool:
+        """Check if a root-relative POSIX path is included and not excluded."""
+        included = excluded = False
+        
+        def on_match(match_id, start, end, flags, context):
+            nonlocal included, excluded
+            if match_id < self._num_include:
+                included = True
+            else:
+                excluded = True
+        
+        self._db.scan(
+            rel_path.encode("utf-8", "surrogateescape"),
+            match_event_handler=on_match,
+        )
+        return included and not excluded
+
 
 class ChangeDetector:
     """Detects file changes using content hashing."""
     
-    def __init__(self, config: Config, state: StateManager):
+    def __init__(self, config: Config, state: StateManager, keep_sources: bool = False):
+        """Create a change detector.
+        
+        Args:
+            config: Project configuration
+            state: Stored state to compare against
+            keep_sources: Keep the bytes of (small) hashed files in `sources`
+                          so they can be parsed without reading them again
+        """
         self.config = config
         self.state = state
         self.root = Path.cwd()
+        self._include_re = _compile_globs(config.include)
+        self._exclude_re = _compile_globs(config.exclude)
+        self._hs_matcher = None
+        if hyperscan is not None and config.include:
+            try:
+                self._hs_matcher = _HyperscanMatcher(config.include, config.exclude)
+            except hyperscan.error:
+                pass  # Pattern Hyperscan can't compile; use the regexes
+        # Directory excludes ("**/build/**") can prune whole subtrees
+        self._prune_re = _compile_globs(
+            [p for p in config.exclude if p.endswith("/**")]
+        )
+        # (size, mtime_ns) of every included file seen, keyed by relative path
+        self.file_stats: dict[str, tuple[int, int]] = {}
+        self.keep_sources = keep_sources
+        # Contents of hashed files, populated when keep_sources is set
+        self.sources: dict[Path, bytes] = {}
     
-    def _hash_file(self, path: Path) -> str:
-        """Compute SHA-256 hash of file content."""
-        hasher = hashlib.sha256()
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hasher.update(chunk)
-        return f"sha256:{hasher.hexdigest()}"
+    def _hash_one(self, path: Path, keep: bool) -> str:
+        """Hash a file, keeping its contents in `sources` if requested."""
+        if not keep:
+            return hash_file(path)
+        data = path.read_bytes()
+        self.sources[path] = data
+        return hash_bytes(data)
     
-    def _matches_pattern(self, path: Path, pattern: str) -> bool:
-        """Check if path matches a glob pattern."""
-        rel_path = str(path.relative_to(self.root))
-        # Handle ** patterns
-        if "**" in pattern:
-            parts = pattern.split("**")
-            if len(parts) == 2:
-                prefix, suffix = parts
-                prefix = prefix.rstrip("/")
-                suffix = suffix.lstrip("/")
-                
-                # Check if path starts with prefix (if any)
-                if prefix and not rel_path.startswith(prefix):
-                    return False
-                
-                # Check if path ends with suffix pattern
-                if suffix:
-                    return fnmatch(rel_path, f"*{suffix}")
-                return True
-        return fnmatch(rel_path, pattern)
+    def _hash_files(self, files: list[tuple[Path, int]]) -> list[str]:
+        """Hash (path, size) entries concurrently, returning hashes in input order.
+        
+        Both hashlib and blake3 release the GIL while hashing, so threads
+        overlap disk reads and hashing work.
+        """
+        budget = _MAX_KEPT_TOTAL_SIZE if self.keep_sources else 0
+        paths, keeps = [], []
+        for path, size in files:
+            keep = self.keep_sources and size <= min(budget, _MAX_KEPT_FILE_SIZE)
+            if keep:
+                budget -= size
+            paths.append(path)
+            keeps.append(keep)
+        
+        if len(paths) <= 1:
+            return [self._hash_one(path, keep) for path, keep in zip(paths, keeps)]
+        
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self._hash_one, paths, keeps))
+    
+    def _should_include(self, rel_path: str) -> bool:
+        """Check if a root-relative POSIX path matches the config patterns."""
+        if self._hs_matcher is not None:
+            return self._hs_matcher.should_include(rel_path)
+        if self._exclude_re.fullmatch(rel_path):
+            return False
+        return self._include_re.fullmatch(rel_path) is not None
     
-    def _should_include(self, path: Path) -> bool:
-        """Check if file should be included based on config patterns."""
-        # Check excludes first
-        for pattern in self.config.exclude:
-            if self._matches_pattern(path, pattern):
-                return False
+    def _walk(self):
+        """Yield (path, rel_path, stat_result) for regular files under root.
         
-        # Check includes
-        for pattern in self.config.include:
-            if self._matches_pattern(path, pattern):
-                return True
+        rel_path is root-relative with forward slashes. Directories matching
+        an exclude pattern ending in `/**` are pruned without being entered,
+        and symlinked directories are not followed.
+        """
+        stack = [(str(self.root), "")]
+        while stack:
+            dirpath, rel_dir = stack.pop()
+            try:
+                with os.scandir(dirpath) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            
+            for entry in entries:
+                rel = rel_dir + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self._prune_re.fullmatch(rel + "/"):
+                            stack.append((entry.path, rel + "/"))
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    yield entry.path, rel, st
+    
+    def _iter_included(self):
+        """Yield (path, rel_path, stat_result) for every included file.
         
-        return False
+        Each file is stat'ed exactly once; the result doubles as the
+        is-regular-file check and the (size, mtime) change signature.
+        """
+        for entry_path, rel, st in self._walk():
+            if not self._should_include(rel):
+                continue
+            rel_path = os.path.normpath(rel)
+            self.file_stats[rel_path] = (st.st_size, st.st_mtime_ns)
+            yield Path(entry_path), rel_path, st
     
     def get_all_files(self) -> list[tuple[Path, str]]:
         """Get all files matching include patterns with their hashes."""
-        files = []
-        
-        for path in self.root.rglob("*"):
-            if path.is_file() and self._should_include(path):
-                file_hash = self._hash_file(path)
-                files.append((path, file_hash))
-        
-        return files
+        files = [(path, st.st_size) for path, _, st in self._iter_included()]
+        return list(zip((path for path, _ in files), self._hash_files(files)))
     
     def get_changed_files(self) -> list[tuple[Path, str]]:
-        """Get files that have changed since last run."""
-        changed = []
+        """Get files that have changed since last run.
         
-        for path, file_hash in self.get_all_files():
-            rel_path = str(path.relative_to(self.root))
-            stored_hash = self.state.get_file_hash(rel_path)
-            
-            if stored_hash != file_hash:
+        Files whose size and mtime match the stored state are assumed
+        unchanged and are not hashed.
+        """
+        candidates = []
+        
+        for path, rel_path, st in self._iter_included():
+            stored = self.state.get_file_state(rel_path)
+            if (
+                stored is not None
+                and stored.size == st.st_size
+                and stored.mtime_ns == st.st_mtime_ns
+            ):
+                continue
+            candidates.append((path, stored, st))
+        
+        hashes = self._hash_files([(path, st.st_size) for path, _, st in candidates])
+        
+        changed = []
+        for (path, stored, st), file_hash in zip(candidates, hashes):
+            if stored is None or stored.hash != file_hash:
                 changed.append((path, file_hash))
+            else:
+                # Touched but identical: refresh the signature so the next
+                # run can skip hashing it again
+                stored.size, stored.mtime_ns = st.st_size, st.st_mtime_ns
         
         return changed
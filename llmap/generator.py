@@ -1,30 +1,40 @@
 """Markdown generation for codemap output."""
 
-import hashlib
-from datetime import datetime
+import asyncio
+import functools
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable
 
 from . import __version__
 from .config import Config
+from .hashing import combine_hashes
 from .modules import Module
 from .parser import get_parser_for_file, FileStructure
-from .llm import LLMClient
+from .state import StateManager
+from .summary_cache import SummaryCache
+
+if TYPE_CHECKING:
+    from .llm import LLMClient
 
 
 def _format_metadata_footer(
-    generated_at: datetime,
+    timestamp: str,
     source_hash: str | None = None,
 ) -> str:
     """Generate metadata footer for codemap documents.
     
     Args:
-        generated_at: Timestamp of generation
+        timestamp: Formatted UTC time of generation
         source_hash: Combined hash of source files (optional)
     
     Returns:
         Formatted metadata footer string
     """
-    timestamp = generated_at.strftime("%Y-%m-%dT%H:%M:%S")
     parts = [f"Generated: {timestamp}"]
     
     if source_hash:
@@ -35,73 +45,231 @@ def _format_metadata_footer(
     return f"\n---\n*{' | '.join(parts)}*\n"
 
 
-def _compute_combined_hash(hashes: list[str]) -> str:
-    """Compute a combined hash from a list of file hashes."""
-    combined = "".join(sorted(hashes))
-    return hashlib.sha256(combined.encode()).hexdigest()
+def _parse_file_worker(item: tuple[Path, bytes | None]) -> FileStructure | None:
+    """Parse one file in a pool worker.
+    
+    Args:
+        item: Tuple of (file path, file contents if already read)
+    
+    Returns:
+        Parsed structure, or None if the file is unsupported or fails to parse
+    """
+    path, source = item
+    parser = get_parser_for_file(path)
+    if parser is None:
+        return None
+    try:
+        return parser.parse(path, source)
+    except Exception:
+        # Skip files that fail to parse
+        return None
+
+
+# Path separators in module names become underscores in filenames
+_FILENAME_TRANS = str.maketrans({"/": "_", "\\": "_"})
+
+
+@functools.lru_cache(maxsize=1024)
+def _module_name_to_filename(module_name: str) -> str:
+    """Convert module name to markdown filename."""
+    return module_name.translate(_FILENAME_TRANS) + ".md"
+
+
+# Purpose/Consumes/Produces lines sit right under the module heading, so only
+# this much of each module file is read when building the overview
+_METADATA_HEAD_SIZE = 4096
+
+
+_METADATA_PREFIXES = {
+    "**Purpose**:": "purpose",
+    "**Consumes**:": "consumes",
+    "**Produces**:": "produces",
+}
+_METADATA_PREFIX_TUPLE = tuple(_METADATA_PREFIXES)
+
+
+def _parse_module_metadata(lines) -> dict[str, str]:
+    """Extract purpose/consumes/produces from module markdown in one pass.
+    
+    Args:
+        lines: Iterable of lines (e.g. an open file), consumed lazily
+    
+    Returns:
+        Dict with "purpose", "consumes" and "produces" keys
+    """
+    metadata = {"purpose": "", "consumes": "", "produces": ""}
+    missing = set(metadata)
+    for line in lines:
+        if not line.startswith(_METADATA_PREFIX_TUPLE):
+            continue
+        # Each prefix ends at its only colon, so this recovers the prefix
+        field_name, _, value = line.partition(":")
+        key = _METADATA_PREFIXES[field_name + ":"]
+        metadata[key] = value.strip()
+        missing.discard(key)
+        if not missing:
+            # All fields found; skip the rest of the document
+            break
+    return metadata
 
 
 class MapGenerator:
     """Generates markdown documentation for modules."""
     
-    def __init__(self, config: Config, codemap_path: Path):
+    def __init__(
+        self,
+        config: Config,
+        codemap_path: Path,
+        sources: dict[Path, bytes] | None = None,
+        refresh_cache: bool = False,
+    ):
+        """Create a generator.
+        
+        Args:
+            config: Project configuration
+            codemap_path: The .codemap directory
+            sources: Optional file contents already read by the change detector;
+                     entries are consumed as files are parsed
+            refresh_cache: Ignore cached LLM summaries and regenerate them
+        """
         self.config = config
+        self.sources = sources if sources is not None else {}
         self.codemap_path = codemap_path
         self.modules_path = codemap_path / "modules"
-        self.llm = LLMClient(config)
+        # One timestamp for every document written in this run
+        self.generated_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        self.summary_cache = SummaryCache(codemap_path, refresh=refresh_cache)
+        # Overview metadata of modules written by this generator, by filename
+        self._generated_metadata: dict[str, dict[str, str]] = {}
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
     
-    def _module_name_to_filename(self, module_name: str) -> str:
-        """Convert module name to markdown filename."""
-        return module_name.replace("/", "_").replace("\\", "_") + ".md"
+    @functools.cached_property
+    def llm(self) -> "LLMClient":
+        """LLM client, created on first use so runs that regenerate nothing
+        never load the LLM stack."""
+        from .llm import LLMClient
+        return LLMClient(self.config, cache=self.summary_cache)
     
-    def generate_module(self, module: Module) -> tuple[Path, list[FileStructure]]:
-        """Generate markdown documentation for a module.
+    def __enter__(self) -> "MapGenerator":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """Shut down the parser thread pool, if one was started."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+    
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Return the parser thread pool, starting it on first use.
+        
+        tree-sitter releases the GIL while building each syntax tree, so
+        threads overlap that part; the Python extraction after it is
+        serialized. Threads avoid pickling the in-memory sources and the
+        resulting structures across process boundaries, which modules of a
+        few files don't repay.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+            return self._pool
+    
+    def _parse_files(self, paths: list[Path]) -> list[FileStructure]:
+        """Parse files, fanning out to the thread pool for multi-file modules.
         
         Returns:
-            Tuple of (path to generated markdown file, list of parsed structures)
+            Structures of files that parsed successfully, in input order
+        """
+        items = [(path, self.sources.pop(path, None)) for path in paths]
+        if len(items) > 1:
+            results = self._get_pool().map(_parse_file_worker, items)
+        else:
+            results = map(_parse_file_worker, items)
+        return [structure for structure in results if structure is not None]
+    
+    def is_up_to_date(self, module: Module, module_hash: str | None) -> bool:
+        """Check if a module's doc was generated from exactly these sources.
+        
+        Args:
+            module: Module to check
+            module_hash: Module hash recorded in state when it was last generated
         """
-        # Parse all files in the module
-        structures: list[FileStructure] = []
-        for path, _ in module.files:
-            parser = get_parser_for_file(path)
-            if parser:
-                try:
-                    structure = parser.parse(path)
-                    structures.append(structure)
-                except Exception:
-                    # Skip files that fail to parse
-                    pass
-        
-        # Generate summary using LLM
-        content = self.llm.summarize_module(module, structures)
-        
-        # Write to file
-        filename = self._module_name_to_filename(module.name)
+        if not module_hash:
+            return False
+        if combine_hashes([h for _, h in module.files]) != module_hash:
+            return False
+        return (self.modules_path / _module_name_to_filename(module.name)).exists()
+    
+    def _write_module(self, module: Module, content: str, source_hash: str) -> Path:
+        """Write a module's markdown with its metadata footer."""
+        filename = _module_name_to_filename(module.name)
         output_path = self.modules_path / filename
         
         self.modules_path.mkdir(parents=True, exist_ok=True)
         
-        # Compute combined source hash and append metadata
-        source_hashes = [h for _, h in module.files]
-        combined_hash = _compute_combined_hash(source_hashes)
-        content += _format_metadata_footer(datetime.utcnow(), combined_hash)
+        # Record overview fields now so generate_overview needn't re-read the file
+        self._generated_metadata[filename] = _parse_module_metadata(io.StringIO(content))
         
-        output_path.write_text(content)
+        # Write the summary and metadata footer without concatenating them
+        with output_path.open("w") as f:
+            f.write(content)
+            f.write(_format_metadata_footer(self.generated_at, source_hash))
         
-        return output_path, structures
+        return output_path
+    
+    async def generate_modules(
+        self,
+        modules: list[Module],
+        concurrency: int | None = None,
+        on_done: Callable[[Module], None] | None = None,
+    ) -> dict[str, list[FileStructure]]:
+        """Generate docs for several modules, pipelining their LLM requests.
+        
+        All modules are parsed first (in worker threads), so small modules
+        can be packed into shared requests; see LLMClient.summarize_modules.
+        
+        Args:
+            modules: Modules to document
+            concurrency: Max LLM requests in flight (defaults to llm.concurrency)
+            on_done: Optional callback invoked as each module is written
+        
+        Returns:
+            Map from module name to its parsed FileStructures
+        """
+        all_structures = await asyncio.gather(*(
+            asyncio.to_thread(self._parse_files, [path for path, _ in module.files])
+            for module in modules
+        ))
+        items = list(zip(modules, all_structures))
+        
+        def write(batch: list[int], contents: list[str]) -> None:
+            for index, content in zip(batch, contents):
+                module = modules[index]
+                combined_hash = combine_hashes([h for _, h in module.files])
+                self._write_module(module, content, combined_hash)
+                if on_done is not None:
+                    on_done(module)
+        
+        await self.llm.summarize_modules(items, concurrency, on_batch=write)
+        return {module.name: structures for module, structures in items}
     
     def add_related_modules_section(self, module: Module) -> None:
         """Append a Related Modules section to an existing module file.
         
         This adds navigable links to modules that this module depends on
-        and modules that depend on this module.
+        and modules that depend on this module. Modules with neither are
+        left untouched.
         """
-        filename = self._module_name_to_filename(module.name)
-        output_path = self.modules_path / filename
-        
-        if not output_path.exists():
+        if not module.dependencies and not module.dependents:
             return
         
+        filename = _module_name_to_filename(module.name)
+        output_path = self.modules_path / filename
+        
         # Build the related modules section
         lines = [
             "",
@@ -114,61 +282,88 @@ class MapGenerator:
         if module.dependencies:
             lines.append("**Depends on**:")
             for dep_name in sorted(module.dependencies):
-                dep_filename = self._module_name_to_filename(dep_name)
+                dep_filename = _module_name_to_filename(dep_name)
                 lines.append(f"- [{dep_name}](./{dep_filename})")
             lines.append("")
         
         if module.dependents:
             lines.append("**Depended by**:")
             for dep_name in sorted(module.dependents):
-                dep_filename = self._module_name_to_filename(dep_name)
+                dep_filename = _module_name_to_filename(dep_name)
                 lines.append(f"- [{dep_name}](./{dep_filename})")
             lines.append("")
         
-        if not module.dependencies and not module.dependents:
-            lines.append("*No direct module dependencies detected.*")
-            lines.append("")
-        
-        # Append to existing content
-        existing_content = output_path.read_text()
-        output_path.write_text(existing_content + "\n".join(lines))
+        # Append to existing content ("a" mode would create a missing file)
+        try:
+            with output_path.open("r+") as f:
+                f.seek(0, os.SEEK_END)
+                f.write("\n".join(lines))
+        except FileNotFoundError:
+            return
     
-    def generate_overview(self) -> Path:
+    def generate_overview(self, state: StateManager | None = None) -> Path:
         """Generate overview.md that indexes all modules.
         
+        Args:
+            state: Optional state manager. Metadata of each module is cached
+                   in its ModuleState, keyed by the module hash, so only
+                   modules without a current cache entry are read.
+        
         Returns:
             Path to the generated overview file.
         """
         overview_path = self.codemap_path / "overview.md"
         
         # Collect all module files
-        module_files = sorted(self.modules_path.glob("*.md"))
+        try:
+            with os.scandir(self.modules_path) as entries:
+                module_files = sorted(
+                    Path(entry.path) for entry in entries
+                    if entry.name.endswith(".md") and entry.is_file()
+                )
+        except FileNotFoundError:
+            module_files = []
+        
+        module_states = {}
+        if state is not None:
+            module_states = {
+                _module_name_to_filename(name): ms
+                for name, ms in state.state.modules.items()
+            }
         
         # Extract module info (name, purpose, consumes, produces)
         modules_info = []
         for module_file in module_files:
-            content = module_file.read_text()
-            lines = content.split("\n")
-            name = module_file.stem.replace("_", "/")
+            module_state = module_states.get(module_file.name)
+            cache = module_state.overview_cache if module_state else {}
+            metadata = self._generated_metadata.get(module_file.name)
             
-            purpose = ""
-            consumes = ""
-            produces = ""
+            if metadata is None:
+                if (
+                    module_state is not None
+                    and module_state.module_hash
+                    and cache.get("module_hash") == module_state.module_hash
+                ):
+                    metadata = {key: cache[key] for key in _METADATA_PREFIXES.values()}
+                else:
+                    with module_file.open("rb") as f:
+                        data = f.read(_METADATA_HEAD_SIZE)
+                    if len(data) == _METADATA_HEAD_SIZE:
+                        # Drop the trailing partial line
+                        data = data[:data.rfind(b"\n") + 1]
+                    text = data.decode("utf-8", errors="replace")
+                    metadata = _parse_module_metadata(text.splitlines())
             
-            for line in lines:
-                if line.startswith("**Purpose**:"):
-                    purpose = line.replace("**Purpose**:", "").strip()
-                elif line.startswith("**Consumes**:"):
-                    consumes = line.replace("**Consumes**:", "").strip()
-                elif line.startswith("**Produces**:"):
-                    produces = line.replace("**Produces**:", "").strip()
+            if module_state is not None:
+                module_state.overview_cache = {
+                    **metadata,
+                    "module_hash": module_state.module_hash,
+                }
             
             modules_info.append({
-                "name": name,
+                "name": module_file.stem.replace("_", "/"),
                 "file": module_file.name,
-                "purpose": purpose,
-                "consumes": consumes,
-                "produces": produces,
+                **metadata,
             })
         
         # Group modules by category (first path component)
@@ -181,19 +376,20 @@ class MapGenerator:
             categories[category].append(info)
         
         # Build output
-        lines = [
-            "# Code Map Overview",
-            "",
-            "This document provides a high-level overview of the codebase architecture.",
-            "",
-            "## Module Dependency Graph",
-            "",
-        ]
+        buf = io.StringIO()
+        write = buf.write
+        write(
+            "# Code Map Overview\n"
+            "\n"
+            "This document provides a high-level overview of the codebase architecture.\n"
+            "\n"
+            "## Module Dependency Graph\n"
+            "\n"
+        )
         
         # Generate dependency graph grouped by category
         for category, mods in sorted(categories.items()):
-            lines.append(f"### {category}")
-            lines.append("")
+            write(f"### {category}\n\n")
             for mod in mods:
                 parts = []
                 if mod["consumes"]:
@@ -202,22 +398,21 @@ class MapGenerator:
                     parts.append(f"produces: {mod['produces']}")
                 
                 if parts:
-                    lines.append(f"- `{mod['name']}` → {' | '.join(parts)}")
+                    write(f"- `{mod['name']}` → {' | '.join(parts)}\n")
                 else:
-                    lines.append(f"- `{mod['name']}`")
-            lines.append("")
+                    write(f"- `{mod['name']}`\n")
+            write("\n")
         
         # Module list section
-        lines.append("## Modules")
-        lines.append("")
+        write("## Modules\n")
         
         for info in modules_info:
             rel_path = f"modules/{info['file']}"
-            lines.append(f"- [{info['name']}]({rel_path}) – {info['purpose']}")
+            write(f"\n- [{info['name']}]({rel_path}) – {info['purpose']}")
         
         # Append metadata footer
-        content = "\n".join(lines)
-        content += _format_metadata_footer(datetime.utcnow())
+        write(_format_metadata_footer(self.generated_at))
+        content = buf.getvalue()
         
         overview_path.write_text(content)
         return overview_path
@@ -0,0 +1,53 @@
+"""Content hashing using BLAKE3, or SHA-256 where blake3 cannot be installed.
+
+Hashes are bare hex digests; ALGORITHM names the algorithm that produced
+them and is recorded once in the state file rather than on every hash.
+"""
+
+import hashlib
+from pathlib import Path
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+ALGORITHM = "blake3" if blake3 is not None else "sha256"
+
+
+def hash_bytes(data: bytes) -> str:
+    """Compute hash of an in-memory buffer."""
+    if blake3 is not None:
+        return blake3.blake3(data).hexdigest()
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Compute hash of file content.
+
+    Uses BLAKE3 (memory-mapped, multi-threaded), falling back to SHA-256
+    read in chunks on platforms without blake3.
+    """
+    if blake3 is not None:
+        hasher = blake3.blake3(max_threads=blake3.blake3.AUTO)
+        hasher.update_mmap(path)
+        return hasher.hexdigest()
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8192), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def combine_hashes(hashes: list[str]) -> str:
+    """Combine file hashes into one order-independent digest.
+
+    Used as the module hash: two modules built from the same set of file
+    contents produce the same value. Uses BLAKE3, or BLAKE2b without it.
+    """
+    hasher = blake3.blake3() if blake3 is not None else hashlib.blake2b(digest_size=32)
+    # Same digest as hashing the concatenation, without building it
+    for file_hash in sorted(hashes):
+        hasher.update(file_hash.encode())
+    return hasher.hexdigest()
@@ -1,30 +1,46 @@
 """LLM client abstraction using litellm."""
 
+import asyncio
+import io
+import re
+from itertools import chain, islice
+from string import Template
+from typing import Callable
+
+import litellm
+
 from .config import Config
+from .hashing import hash_bytes
 from .modules import Module
 from .parser import FileStructure, FunctionInfo, Visibility
+from .summary_cache import SummaryCache
+
 
+# Prompt pieces for module summarization ($-placeholders, see string.Template)
 
-# LLM prompt template for module summarization
-MODULE_PROMPT = """\
-You are generating documentation for a code module to help other LLMs understand the codebase architecture.
+# Per-module input data
+MODULE_DATA = """\
+## Module: $module_name
 
-## Module: {module_name}
+## Location: `$module_path`
 
 ## Files:
-{file_list}
+$file_list
 
 ## Extracted Structure:
-{structure_summary}
+$structure_summary
+"""
 
+# Document template and guidance
+DOC_INSTRUCTIONS = """\
 Generate a markdown document following this template:
 
 ````markdown
-# Module: {module_name}
+# Module: $module_name
 
 **Purpose**: [One sentence describing what this module does]
 
-**Location**: `{module_path}`
+**Location**: `$module_path`
 
 **Consumes**: [What data/artifacts this module takes as input, e.g., "Source files", "Token stream", "AST"]
 
@@ -97,6 +113,49 @@ Focus on:
 Be concise. Avoid restating obvious code. Focus on architectural understanding.
 """
 
+# Static instructions, sent as the system message of every request so
+# providers can cache the shared prefix
+SYSTEM_PROMPT = (
+    "You are generating documentation for code modules to help other LLMs "
+    "understand the codebase architecture. The user message gives each "
+    "module's name, location, files and extracted structure.\n\n"
+    + Template(DOC_INSTRUCTIONS).safe_substitute(
+        module_name="<module name>",
+        module_path="<module path>",
+    )
+)
+
+# User message for summarizing several small modules in one request
+MARSHALED_PROMPT = """\
+Write a separate document for EACH module below.
+
+$modules
+## OUTPUT FORMAT
+
+Wrap each module's document in these delimiters, in the order given above:
+
+<<<MODULE:module name>>>
+...markdown document...
+<<</MODULE>>>
+"""
+
+# Parsed once; substitute() only fills in the placeholders
+_MODULE_DATA_TEMPLATE = Template(MODULE_DATA)
+_MARSHALED_PROMPT_TEMPLATE = Template(MARSHALED_PROMPT)
+
+# One module's document in a marshaled response
+_MARSHALED_RE = re.compile(r"<<<MODULE:(.+?)>>>(.*?)<<</MODULE>>>", re.DOTALL)
+
+# An opening code fence line and any whitespace following it
+_OPENING_FENCE_RE = re.compile(r"```(?:[^\n]*\n)?\s*")
+
+# Rough characters per token, for packing modules into a request
+_CHARS_PER_TOKEN = 4
+
+# Each module in a batch gets a full document in the one response, so
+# batches stay small enough for that output to fit a single reply
+_MAX_BATCH_MODULES = 4
+
 
 def _partition_by_visibility(
     items: list[FunctionInfo],
@@ -106,105 +165,117 @@ def _partition_by_visibility(
     protected = []
     private = []
     
+    # PRIVATE or UNKNOWN fall through to private, treated as internal
+    buckets = {Visibility.PUBLIC: public.append, Visibility.PROTECTED: protected.append}
+    get_bucket = buckets.get
+    default = private.append
     for item in items:
-        if item.visibility == Visibility.PUBLIC:
-            public.append(item)
-        elif item.visibility == Visibility.PROTECTED:
-            protected.append(item)
-        else:  # PRIVATE or UNKNOWN treated as internal
-            private.append(item)
+        get_bucket(item.visibility, default)(item)
     
     return public, protected, private
 
 
-def _format_internal_summary(
+def _write_internal_summary(
+    buf: io.StringIO,
     protected: list[FunctionInfo], 
     private: list[FunctionInfo],
-) -> list[str]:
-    """Format a compact summary of internal (non-public) items."""
-    lines = []
-    
+) -> None:
+    """Write a compact summary line of internal (non-public) items."""
     total_internal = len(protected) + len(private)
     if total_internal == 0:
-        return lines
-    
-    # Collect all internal names
-    internal_names = [f.name for f in protected] + [f.name for f in private]
+        return
     
     # Show first few names, then "..." 
     max_preview = 6
-    if len(internal_names) <= max_preview:
-        names_str = ", ".join(internal_names)
-    else:
-        names_str = ", ".join(internal_names[:max_preview]) + ", ..."
-    
-    lines.append(f"    Internal ({total_internal} total): {names_str}")
-    
-    return lines
-
-
-def _format_structure(structures: list[FileStructure]) -> str:
-    """Format extracted structures for the LLM prompt.
-    
-    Uses a tiered approach to balance completeness with token limits:
-    - Public API: Full signatures always included
-    - Internal symbols: Summarized with counts and names
-    """
-    lines = []
-    
+    buf.write(f"    Internal ({total_internal} total): ")
+    buf.write(", ".join(
+        f.name for f in islice(chain(protected, private), max_preview)
+    ))
+    if total_internal > max_preview:
+        buf.write(", ...")
+    buf.write("\n")
+
+
+def _write_structure(buf: io.StringIO, structures: list[FileStructure]) -> None:
+    """Write the structure summary to buf, one newline-terminated line at a time."""
+    write = buf.write
     for struct in structures:
-        lines.append(f"\n### {struct.path.name}")
+        write(f"\n### {struct.path.name}\n")
         
         # Format imports - group by system vs local
         if struct.imports:
-            system_imports = [i for i in struct.imports if i.is_system]
-            local_imports = [i for i in struct.imports if not i.is_system]
+            system_imports = []
+            local_imports = []
+            for imp in struct.imports:
+                (system_imports if imp.is_system else local_imports).append(imp.name)
             
-            lines.append("\nDependencies:")
+            write("\nDependencies:\n")
             if system_imports:
-                lines.append(f"  System ({len(system_imports)}): " + 
-                           ", ".join(i.name for i in system_imports[:8]) +
-                           ("..." if len(system_imports) > 8 else ""))
+                write(f"  System ({len(system_imports)}): ")
+                write(", ".join(system_imports[:8]))
+                write("...\n" if len(system_imports) > 8 else "\n")
             if local_imports:
-                lines.append(f"  Local ({len(local_imports)}): " + 
-                           ", ".join(i.name for i in local_imports[:10]) +
-                           ("..." if len(local_imports) > 10 else ""))
+                write(f"  Local ({len(local_imports)}): ")
+                write(", ".join(local_imports[:10]))
+                write("...\n" if len(local_imports) > 10 else "\n")
         
         # Format classes with tiered method display
         if struct.classes:
-            lines.append("\nClasses/Structs:")
+            write("\nClasses/Structs:\n")
             for cls in struct.classes:
-                lines.append(f"  **{cls.name}** (lines {cls.line_start}-{cls.line_end})")
+                write(f"  **{cls.name}** (lines {cls.line_start}-{cls.line_end})\n")
                 
                 if cls.methods:
                     public, protected, private = _partition_by_visibility(cls.methods)
                     
                     # Public methods: full signatures
                     if public:
-                        lines.append("    Public API:")
+                        write("    Public API:\n")
                         for method in public:
-                            lines.append(f"      - {method.signature}")
+                            write(f"      - {method.signature}\n")
                     
                     # Internal methods: summarized
-                    lines.extend(_format_internal_summary(protected, private))
+                    _write_internal_summary(buf, protected, private)
         
         # Format top-level functions with tiered display
         if struct.functions:
             public, protected, private = _partition_by_visibility(struct.functions)
             
             if public:
-                lines.append("\nPublic Functions:")
+                write("\nPublic Functions:\n")
                 for func in public:
-                    lines.append(f"  - {func.signature}")
+                    write(f"  - {func.signature}\n")
             
             # Internal functions summary
             if protected or private:
-                internal_lines = _format_internal_summary(protected, private)
-                if internal_lines:
-                    lines.append("\nInternal Functions:")
-                    lines.extend(internal_lines)
+                write("\nInternal Functions:\n")
+                _write_internal_summary(buf, protected, private)
+
+
+def _format_structure(structures: list[FileStructure]) -> str:
+    """Format extracted structures for the LLM prompt.
     
-    return "\n".join(lines)
+    Uses a tiered approach to balance completeness with token limits:
+    - Public API: Full signatures always included
+    - Internal symbols: Summarized with counts and names
+    """
+    buf = io.StringIO()
+    _write_structure(buf, structures)
+    # Lines are newline-terminated; the summary has no trailing newline
+    return buf.getvalue()[:-1]
+
+
+def _strip_fences(content: str) -> str:
+    """Strip a markdown code fence wrapped around an LLM response."""
+    content = content.strip()
+    # Drop the whole opening fence line, whatever its info string, and the
+    # whitespace after it in the same slice
+    opening = _OPENING_FENCE_RE.match(content)
+    if opening:
+        content = content[opening.end():]
+    if content.endswith("```"):
+        content = content[:-3].rstrip()
+    return content
 
 
 def _format_file_list(module: Module) -> str:
@@ -218,44 +289,235 @@ def _format_file_list(module: Module) -> str:
 class LLMClient:
     """Wrapper around litellm for LLM interactions."""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, cache: SummaryCache | None = None):
+        """Create a client.
+        
+        Args:
+            config: Project configuration
+            cache: Optional response cache; summaries are looked up by a hash
+                   of the model, prompt and source file hashes before any
+                   request is sent
+        """
         self.config = config
         self.model = f"{config.llm.provider}/{config.llm.model}"
+        self.cache = cache
+        
+        # Passed on every request rather than set in the environment, so
+        # clients with different endpoints don't interfere
+        self._base_kwargs = {"temperature": 0.3}  # Lower temperature for more consistent output
+        if config.llm.api_base:
+            self._base_kwargs["api_base"] = config.llm.api_base
+    
+    def _messages(self, user_content: str) -> list[dict]:
+        """Build chat messages: the static system prompt, then the request."""
+        if self.config.llm.provider == "anthropic":
+            # Mark the shared preamble for Anthropic prompt caching
+            system = [{
+                "type": "text",
+                "text": SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }]
+        else:
+            # OpenAI and Ollama reuse a stable prompt prefix on their own
+            system = SYSTEM_PROMPT
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user_content},
+        ]
+    
+    def _completion_kwargs(self, user_content: str) -> dict:
+        """Build litellm completion arguments for a request."""
+        return {
+            "model": self.model,
+            "messages": self._messages(user_content),
+            **self._base_kwargs,
+        }
     
-    def summarize_module(
+    def _cache_key(self, module: Module, module_data: str) -> str:
+        """Hash everything that determines a module's summary."""
+        parts = [self.model, SYSTEM_PROMPT, module_data]
+        parts.extend(file_hash for _, file_hash in module.files)
+        return hash_bytes("\0".join(parts).encode())
+    
+    async def _complete(
         self,
-        module: Module,
-        structures: list[FileStructure],
+        kwargs: dict,
+        semaphore: asyncio.Semaphore | None = None,
     ) -> str:
-        """Generate a markdown summary for a module."""
-        import os
-        import litellm
+        """Stream a completion and return its accumulated text.
         
-        # Set Ollama base URL if configured
-        if self.config.llm.provider == "ollama" and self.config.llm.api_base:
-            os.environ["OLLAMA_API_BASE"] = self.config.llm.api_base
-        
-        prompt = MODULE_PROMPT.format(
+        Args:
+            kwargs: Arguments from _completion_kwargs
+            semaphore: Optional semaphore, held until the stream finishes
+        """
+        if semaphore is None:
+            return await self._stream(kwargs)
+        async with semaphore:
+            return await self._stream(kwargs)
+    
+    async def _stream(self, kwargs: dict) -> str:
+        chunks = []
+        async for chunk in await litellm.acompletion(**kwargs, stream=True):
+            # Some providers end with a usage-only chunk that has no choices
+            if chunk.choices:
+                chunks.append(chunk.choices[0].delta.content or "")
+        return "".join(chunks)
+    
+    def _module_data(self, module: Module, structures: list[FileStructure]) -> str:
+        """Render a module's input data block (the per-module user message)."""
+        return _MODULE_DATA_TEMPLATE.substitute(
             module_name=module.name,
             module_path=module.path,
             file_list=_format_file_list(module),
             structure_summary=_format_structure(structures),
         )
+    
+    def plan_batches(self, module_data: list[str]) -> list[list[int]]:
+        """Group small modules so several can be summarized in one request.
         
-        response = litellm.completion(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,  # Lower temperature for more consistent output
-        )
+        Modules are packed greedily, in order, until their estimated prompt
+        tokens reach llm.batch_tokens or the batch holds _MAX_BATCH_MODULES
+        modules. A module estimated at more than half the budget is always
+        sent on its own; a budget of 0 disables packing.
+        
+        Args:
+            module_data: Rendered input block of each module (see _module_data)
+        
+        Returns:
+            Batches of indexes into module_data
+        """
+        budget = self.config.llm.batch_tokens
+        batches: list[list[int]] = []
+        current: list[int] = []
+        used = 0
+        
+        for index, data in enumerate(module_data):
+            tokens = len(data) // _CHARS_PER_TOKEN
+            if budget <= 0 or tokens > budget // 2:
+                batches.append([index])
+                continue
+            if current and (used + tokens > budget or len(current) == _MAX_BATCH_MODULES):
+                batches.append(current)
+                current, used = [], 0
+            current.append(index)
+            used += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def _summarize(
+        self,
+        module: Module,
+        module_data: str,
+        semaphore: asyncio.Semaphore | None = None,
+    ) -> str:
+        """Summarize one module from its already rendered input block."""
+        kwargs = self._completion_kwargs(module_data)
         
-        content = response.choices[0].message.content
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(module, module_data)
+            content = self.cache.get(key)
+            if content is not None:
+                return content
         
-        # Strip markdown code fences if present
-        if content.startswith("```markdown"):
-            content = content[len("```markdown"):].strip()
-        if content.startswith("```"):
-            content = content[3:].strip()
-        if content.endswith("```"):
-            content = content[:-3].strip()
+        content = _strip_fences(await self._complete(kwargs, semaphore))
         
+        if key is not None:
+            self.cache.put(key, content)
         return content
+    
+    async def summarize_batch_async(
+        self,
+        modules: list[Module],
+        module_data: list[str],
+        semaphore: asyncio.Semaphore | None = None,
+    ) -> list[str]:
+        """Summarize a batch from plan_batches, marshaled into one request.
+        
+        Cached modules are not sent. Modules missing from a malformed
+        response fall back to one request each.
+        
+        Args:
+            modules: Modules in the batch
+            module_data: Rendered input block of each module (see _module_data)
+            semaphore: Optional semaphore bounding concurrent requests
+        
+        Returns:
+            Summaries in the same order as modules
+        """
+        if len(modules) == 1:
+            return [await self._summarize(modules[0], module_data[0], semaphore)]
+        
+        keys: list[str | None] = [None] * len(modules)
+        results: list[str | None] = [None] * len(modules)
+        if self.cache is not None:
+            for index, module in enumerate(modules):
+                keys[index] = self._cache_key(module, module_data[index])
+                results[index] = self.cache.get(keys[index])
+        
+        pending = [index for index, content in enumerate(results) if content is None]
+        if len(pending) > 1:
+            kwargs = self._completion_kwargs(_MARSHALED_PROMPT_TEMPLATE.substitute(
+                modules="\n".join(module_data[index] for index in pending),
+            ))
+            response = await self._complete(kwargs, semaphore)
+            
+            sections = {
+                name.strip(): _strip_fences(body)
+                for name, body in _MARSHALED_RE.findall(response)
+            }
+            for index in pending:
+                content = sections.get(modules[index].name)
+                if content:
+                    results[index] = content
+                    if keys[index] is not None:
+                        self.cache.put(keys[index], content)
+        
+        # Anything not answered above gets its own request
+        missing = [index for index, content in enumerate(results) if content is None]
+        contents = await asyncio.gather(*(
+            self._summarize(modules[index], module_data[index], semaphore)
+            for index in missing
+        ))
+        for index, content in zip(missing, contents):
+            results[index] = content
+        
+        return results
+    
+    async def summarize_modules(
+        self,
+        items: list[tuple[Module, list[FileStructure]]],
+        concurrency: int | None = None,
+        on_batch: Callable[[list[int], list[str]], None] | None = None,
+    ) -> list[str]:
+        """Summarize several modules with concurrent, batched requests.
+        
+        Args:
+            items: List of (module, parsed structures) tuples
+            concurrency: Max requests in flight (defaults to llm.concurrency)
+            on_batch: Optional callback invoked as each batch completes, with
+                      the batch's indexes into items and their summaries
+        
+        Returns:
+            Summaries in the same order as items
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency or self.config.llm.concurrency))
+        # Rendered once; used for batch planning, the request and the cache key
+        module_data = [self._module_data(*item) for item in items]
+        results: list[str] = [""] * len(items)
+        
+        async def summarize(batch: list[int]) -> None:
+            contents = await self.summarize_batch_async(
+                [items[index][0] for index in batch],
+                [module_data[index] for index in batch],
+                semaphore,
+            )
+            for index, content in zip(batch, contents):
+                results[index] = content
+            if on_batch is not None:
+                on_batch(batch, contents)
+        
+        await asyncio.gather(*(summarize(batch) for batch in self.plan_batches(module_data)))
+        return results
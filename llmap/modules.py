@@ -1,12 +1,13 @@
 """Module grouping logic."""
 
+import os
 from dataclasses import dataclass, field
 from pathlib import Path
 
 from .config import Config
 
 
-@dataclass
+@dataclass(slots=True)
 class Module:
     """Represents a logical module grouping."""
     name: str
@@ -26,11 +27,13 @@ class ModuleGrouper:
         self.config = config
         self.root = Path.cwd()
     
-    def _get_module_name(self, path: Path) -> str:
-        """Determine module name for a file based on strategy."""
-        rel_path = path.relative_to(self.root)
-        parts = rel_path.parts
+    def _get_module_name(self, rel_path: Path, parts: tuple[str, ...]) -> str:
+        """Determine module name for a file based on strategy.
         
+        Args:
+            rel_path: File path relative to the project root
+            parts: rel_path.parts, split once by the caller
+        """
         if self.config.modules.strategy == "directory":
             # Use directory at configured depth as module name
             depth = self.config.modules.depth
@@ -63,13 +66,12 @@ class ModuleGrouper:
         modules: dict[str, Module] = {}
         
         for path, file_hash in files:
-            module_name = self._get_module_name(path)
+            rel_path = path.relative_to(self.root)
+            parts = rel_path.parts
+            module_name = self._get_module_name(rel_path, parts)
             
             if module_name not in modules:
                 # Determine module path (directory containing the module)
-                rel_path = path.relative_to(self.root)
-                parts = rel_path.parts
-                
                 if self.config.modules.strategy == "directory":
                     depth = self.config.modules.depth
                     if len(parts) > depth:
@@ -86,6 +88,11 @@ class ModuleGrouper:
         return list(modules.values())
 
 
+def _to_posix(path: str) -> str:
+    """Convert a relative path string to forward slashes."""
+    return path.replace(os.sep, "/") if os.sep != "/" else path
+
+
 class DependencyResolver:
     """Resolves dependencies between modules based on import analysis."""
     
@@ -100,22 +107,38 @@ class DependencyResolver:
         """
         self.modules = modules
         self.root = Path.cwd()
-        # Map from file path (relative) to module name
+        self._root_prefix = os.path.join(str(self.root), "")
+        # (importing directory, import name) -> resolved module name
+        self._resolved: dict[tuple[str, str], str | None] = {}
+        # Map from file path (relative, forward slashes) to module name
         self._file_to_module: dict[str, str] = {}
         
         if all_files:
             # Use complete file mapping for accurate dependency resolution
-            self._file_to_module = dict(all_files)
+            for rel_path, module_name in all_files.items():
+                self._file_to_module[_to_posix(rel_path)] = module_name
         else:
             # Fall back to building from provided modules
             for module in modules:
                 for path, _ in module.files:
-                    rel_path = str(path.relative_to(self.root))
+                    rel_path = path.relative_to(self.root).as_posix()
                     self._file_to_module[rel_path] = module.name
+        
+        # Basename -> relative path, for basenames that occur only once
+        self._unique_basenames: dict[str, str | None] = {}
+        for rel_path in self._file_to_module:
+            basename = rel_path.rpartition("/")[2]
+            # A second file with the same name makes the basename ambiguous
+            self._unique_basenames[basename] = (
+                None if basename in self._unique_basenames else rel_path
+            )
     
     def resolve_import(self, importing_file: Path, import_name: str) -> str | None:
         """Resolve an import to a module name.
         
+        Results are memoized per (importing directory, import name), since
+        files in one directory tend to share includes.
+        
         Args:
             importing_file: The file containing the import
             import_name: The import path (e.g., "../lexer/token.h" or "semantic.h")
@@ -123,19 +146,49 @@ class DependencyResolver:
         Returns:
             Module name if resolved, None otherwise
         """
+        key = (str(importing_file.parent), import_name)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        result = self._resolved[key] = self._resolve(key[0], import_name)
+        return result
+    
+    def _resolve(self, parent: str, import_name: str) -> str | None:
+        """Resolve an import by direct match, lexical path, resolve(), then unique basename."""
         # Try direct filename match first
-        if import_name in self._file_to_module:
-            return self._file_to_module[import_name]
+        name = _to_posix(import_name)
+        name = name.removeprefix("./")
+        if name in self._file_to_module:
+            return self._file_to_module[name]
         
-        # Try resolving relative path from importing file's directory
+        # Try the path relative to the importing file's directory, normalized
+        # lexically so no filesystem access is needed
+        import_path = os.path.normpath(os.path.join(parent, import_name))
+        if import_path.startswith(self._root_prefix):
+            rel_path = _to_posix(import_path[len(self._root_prefix):])
+        elif not os.path.isabs(import_path):
+            rel_path = _to_posix(import_path)
+        else:
+            rel_path = None
+        if rel_path in self._file_to_module:
+            return self._file_to_module[rel_path]
+        
+        # Fall back to resolving symlinks on disk
         try:
-            import_path = (importing_file.parent / import_name).resolve()
-            rel_path = str(import_path.relative_to(self.root))
+            import_path = (Path(parent) / import_name).resolve()
+            rel_path = import_path.relative_to(self.root).as_posix()
             if rel_path in self._file_to_module:
                 return self._file_to_module[rel_path]
         except (ValueError, OSError):
             pass
         
+        # Finally, a file elsewhere on the include path whose name is unique
+        # in the project, e.g. "token.h" or "lexer/token.h" for src/lexer/token.h
+        rel_path = self._unique_basenames.get(name.rpartition("/")[2])
+        if rel_path and (rel_path == name or rel_path.endswith("/" + name)):
+            return self._file_to_module[rel_path]
+        
         return None
     
     def build_dependency_graph(
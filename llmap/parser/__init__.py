@@ -1,6 +1,13 @@
 """Parser package for code structure extraction."""
 
-from .base import BaseParser, FileStructure, FunctionInfo, ClassInfo, ImportInfo, Visibility
+from .base import (
+    BaseParser,
+    FileStructure,
+    FunctionInfo,
+    ClassInfo,
+    ImportInfo,
+    Visibility,
+)
 from .cpp import CppParser
 
 __all__ = [
@@ -15,12 +22,13 @@ __all__ = [
 ]
 
 
+# One shared instance per parser, indexed by the extensions it handles
+_PARSERS: tuple[BaseParser, ...] = (CppParser(),)
+_EXT_MAP: dict[str, BaseParser] = {
+    ext: parser for parser in _PARSERS for ext in parser.extensions
+}
+
+
 def get_parser_for_file(path) -> BaseParser | None:
     """Get appropriate parser for a file based on extension."""
-    parsers = [CppParser()]
-    
-    for parser in parsers:
-        if parser.can_parse(path):
-            return parser
-    
-    return None
+    return _EXT_MAP.get(path.suffix.lower())
@@ -14,7 +14,7 @@ class Visibility(Enum):
     UNKNOWN = "unknown"  # For languages without explicit visibility
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionInfo:
     """Information about a function/method."""
     name: str
@@ -25,7 +25,7 @@ class FunctionInfo:
     visibility: Visibility = Visibility.UNKNOWN
 
 
-@dataclass 
+@dataclass(slots=True)
 class ClassInfo:
     """Information about a class/struct."""
     name: str
@@ -36,14 +36,14 @@ class ClassInfo:
     visibility: Visibility = Visibility.UNKNOWN
 
 
-@dataclass
+@dataclass(slots=True)
 class ImportInfo:
     """Information about an import/include."""
     name: str
     is_system: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class FileStructure:
     """Extracted structure from a source file."""
     path: Path
@@ -56,21 +56,23 @@ class FileStructure:
 class BaseParser(ABC):
     """Abstract base class for language-specific parsers."""
     
+    # Lowercase file extensions (with leading dot) this parser handles
+    extensions: tuple[str, ...] = ()
+    
     @property
     @abstractmethod
     def language(self) -> str:
         """Return the language this parser handles."""
         pass
     
-    @property
-    @abstractmethod
-    def extensions(self) -> list[str]:
-        """Return file extensions this parser handles."""
-        pass
-    
     @abstractmethod
-    def parse(self, path: Path) -> FileStructure:
-        """Parse a source file and extract its structure."""
+    def parse(self, path: Path, source: bytes | None = None) -> FileStructure:
+        """Parse a source file and extract its structure.
+        
+        Args:
+            path: Path of the source file
+            source: File contents, if already in memory (read from path otherwise)
+        """
         pass
     
     def can_parse(self, path: Path) -> bool:
@@ -1,9 +1,10 @@
 """C++ parser using tree-sitter."""
 
+import threading
 from pathlib import Path
 
 import tree_sitter_cpp as tscpp
-from tree_sitter import Language, Parser
+from tree_sitter import Language, Parser, Query, QueryCursor
 
 from .base import (
     BaseParser,
@@ -14,138 +15,215 @@ from .base import (
     Visibility,
 )
 
+# Node discovery runs in tree-sitter's C query engine. Captures come back
+# grouped by name but not in document order, so each list is sorted
+QUERY_SRC = """
+(preproc_include path: (_) @include.path)
+[(class_specifier) (struct_specifier)] @class
+(function_definition) @function
+(namespace_definition !name) @anonymous_namespace
+"""
+
+_LANGUAGE = Language(tscpp.language())
+_QUERY = Query(_LANGUAGE, QUERY_SRC)
+
+# A tree-sitter Parser must not be used concurrently: keep one per thread,
+# shared by every CppParser instance
+_tls = threading.local()
+
+
+def _get_ts_parser() -> Parser:
+    parser = getattr(_tls, "parser", None)
+    if parser is None:
+        parser = _tls.parser = Parser(_LANGUAGE)
+    return parser
+
+
+def _enclosed(nodes: list, containers: list) -> list[bool]:
+    """Flag which nodes lie inside any of the containers.
+    
+    Both lists must be in document order. Syntax nodes nest properly, so a
+    single sweep with a stack of open containers answers each lookup.
+    
+    Args:
+        nodes: Nodes to test
+        containers: Candidate ancestor nodes
+    
+    Returns:
+        One flag per node, True if some container encloses it
+    """
+    flags = []
+    open_ends: list[int] = []
+    i = 0
+    for node in nodes:
+        start = node.start_byte
+        while i < len(containers) and containers[i].start_byte <= start:
+            container = containers[i]
+            while open_ends and open_ends[-1] <= container.start_byte:
+                open_ends.pop()
+            open_ends.append(container.end_byte)
+            i += 1
+        while open_ends and open_ends[-1] <= start:
+            open_ends.pop()
+        # The outermost open container is the largest; a container opened
+        # at the same byte may be the node's own child, so compare ends
+        flags.append(bool(open_ends) and open_ends[0] >= node.end_byte)
+    return flags
+
+
+def _document_order(node) -> tuple[int, int]:
+    # Parents sort before children that start at the same byte
+    return (node.start_byte, -node.end_byte)
+
+
+# Declarators wrapping the one that names a function, e.g. int *f() or (f)()
+_WRAPPER_DECLARATORS = frozenset({
+    "function_declarator",
+    "pointer_declarator",
+    "reference_declarator",
+    "parenthesized_declarator",
+})
+
+# Class body members whose function definitions are still the class's own
+_MEMBER_WRAPPERS = frozenset({
+    "template_declaration",
+    "friend_declaration",
+    "preproc_if",
+    "preproc_ifdef",
+    "preproc_else",
+    "preproc_elif",
+    "preproc_elifdef",
+})
+
+# Nodes whose text is a function name
+_NAME_TYPES = frozenset({
+    "identifier",
+    "field_identifier",
+    "destructor_name",
+    "operator_name",
+})
+
 
 class CppParser(BaseParser):
     """Parser for C/C++ source files using tree-sitter."""
     
-    def __init__(self):
-        self._parser = Parser(Language(tscpp.language()))
+    extensions = (".cpp", ".cc", ".cxx", ".c", ".h", ".hpp", ".hxx")
     
     @property
     def language(self) -> str:
         return "cpp"
     
-    @property
-    def extensions(self) -> list[str]:
-        return [".cpp", ".cc", ".cxx", ".c", ".h", ".hpp", ".hxx"]
-    
-    def parse(self, path: Path) -> FileStructure:
+    def parse(self, path: Path, source: bytes | None = None) -> FileStructure:
         """Parse a C++ file and extract its structure."""
-        content = path.read_bytes()
-        tree = self._parser.parse(content)
+        content = source if source is not None else path.read_bytes()
+        tree = _get_ts_parser().parse(content)
         
         structure = FileStructure(path=path, language=self.language)
+        captures = {
+            name: sorted(nodes, key=_document_order)
+            for name, nodes in QueryCursor(_QUERY).captures(tree.root_node).items()
+        }
         
-        self._extract_includes(tree.root_node, content, structure)
-        self._extract_classes(tree.root_node, content, structure)
-        self._extract_functions(tree.root_node, content, structure)
+        for path_node in captures.get("include.path", ()):
+            path_text = self._get_text(path_node, content)
+            is_system = path_text.startswith("<")
+            # Strip quotes/brackets
+            name = path_text.strip('<>"')
+            structure.imports.append(ImportInfo(name=name, is_system=is_system))
+        
+        classes = captures.get("class", [])
+        for node in classes:
+            class_info = self._extract_class_info(node, content)
+            if class_info:
+                structure.classes.append(class_info)
+        
+        functions = captures.get("function", [])
+        if functions:
+            in_class = _enclosed(functions, classes)
+            in_anonymous_namespace = _enclosed(
+                functions, captures.get("anonymous_namespace", [])
+            )
+            for node, skip, anonymous in zip(functions, in_class, in_anonymous_namespace):
+                if not skip:
+                    self._add_function(node, content, structure, anonymous)
         
         return structure
     
+    def _slice(self, node, content: bytes) -> bytes:
+        """Extract the raw source bytes of a node."""
+        return content[node.start_byte:node.end_byte]
+    
     def _get_text(self, node, content: bytes) -> str:
         """Extract text from a node."""
-        return content[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
-    
-    def _extract_includes(self, root, content: bytes, structure: FileStructure):
-        """Extract #include directives."""
-        for node in self._find_nodes(root, "preproc_include"):
-            path_node = node.child_by_field_name("path")
-            if path_node:
-                path_text = self._get_text(path_node, content)
-                is_system = path_text.startswith("<")
-                # Strip quotes/brackets
-                name = path_text.strip('<>"')
-                structure.imports.append(ImportInfo(name=name, is_system=is_system))
-    
-    def _extract_classes(self, root, content: bytes, structure: FileStructure):
-        """Extract class/struct definitions."""
-        for node_type in ["class_specifier", "struct_specifier"]:
-            for node in self._find_nodes(root, node_type):
-                name_node = node.child_by_field_name("name")
-                if name_node:
-                    name = self._get_text(name_node, content)
-                    
-                    class_info = ClassInfo(
-                        name=name,
-                        line_start=node.start_point[0] + 1,
-                        line_end=node.end_point[0] + 1,
-                    )
-                    
-                    # Extract methods with visibility tracking
-                    body_node = node.child_by_field_name("body")
-                    if body_node:
-                        # Default: private for class, public for struct
-                        current_visibility = (
-                            Visibility.PRIVATE if node_type == "class_specifier" 
-                            else Visibility.PUBLIC
-                        )
-                        
-                        for child in body_node.children:
-                            # Track visibility changes
-                            if child.type == "access_specifier":
-                                spec_text = self._get_text(child, content).rstrip(":")
-                                if "public" in spec_text:
-                                    current_visibility = Visibility.PUBLIC
-                                elif "protected" in spec_text:
-                                    current_visibility = Visibility.PROTECTED
-                                elif "private" in spec_text:
-                                    current_visibility = Visibility.PRIVATE
-                            elif child.type == "function_definition":
-                                method_info = self._extract_function_info(
-                                    child, content, visibility=current_visibility
-                                )
-                                if method_info:
-                                    class_info.methods.append(method_info)
-                            # Also check for nested function definitions
-                            else:
-                                for method in self._find_nodes(child, "function_definition"):
-                                    method_info = self._extract_function_info(
-                                        method, content, visibility=current_visibility
-                                    )
-                                    if method_info:
-                                        class_info.methods.append(method_info)
-                    
-                    structure.classes.append(class_info)
+        return self._slice(node, content).decode("utf-8", errors="replace")
     
-    def _extract_functions(self, root, content: bytes, structure: FileStructure):
-        """Extract top-level function definitions."""
-        for node in self._find_nodes(root, "function_definition"):
-            # Skip if inside a class
-            parent = node.parent
-            in_class = False
-            in_anonymous_namespace = False
-            
-            while parent:
-                if parent.type in ["class_specifier", "struct_specifier"]:
-                    in_class = True
-                    break
-                # Check for anonymous namespace (namespace_definition without name)
-                if parent.type == "namespace_definition":
-                    if parent.child_by_field_name("name") is None:
-                        in_anonymous_namespace = True
-                parent = parent.parent
-            
-            if in_class:
-                continue
-                
-            # Determine visibility for file-scope functions
-            # Check for static storage class (internal linkage)
-            is_static = any(
-                child.type == "storage_class_specifier" and 
-                self._get_text(child, content).strip() == "static"
-                for child in node.children
+    def _extract_class_info(self, node, content: bytes) -> ClassInfo | None:
+        """Extract a class/struct definition with its methods."""
+        name_node = node.child_by_field_name("name")
+        if not name_node:
+            return None
+        
+        class_info = ClassInfo(
+            name=self._get_text(name_node, content),
+            line_start=node.start_point[0] + 1,
+            line_end=node.end_point[0] + 1,
+        )
+        
+        # Extract methods with visibility tracking
+        body_node = node.child_by_field_name("body")
+        if body_node:
+            # Default: private for class, public for struct
+            current_visibility = (
+                Visibility.PRIVATE if node.type == "class_specifier" 
+                else Visibility.PUBLIC
             )
             
-            if is_static or in_anonymous_namespace:
-                visibility = Visibility.PRIVATE
-            else:
-                visibility = Visibility.PUBLIC
-            
-            func_info = self._extract_function_info(
-                node, content, visibility=visibility
-            )
-            if func_info:
-                structure.functions.append(func_info)
+            for child in body_node.children:
+                # Track visibility changes
+                if child.type == "access_specifier":
+                    spec = self._slice(child, content)
+                    if b"public" in spec:
+                        current_visibility = Visibility.PUBLIC
+                    elif b"protected" in spec:
+                        current_visibility = Visibility.PROTECTED
+                    elif b"private" in spec:
+                        current_visibility = Visibility.PRIVATE
+                else:
+                    for method in self._member_functions(child):
+                        method_info = self._extract_function_info(
+                            method, content, visibility=current_visibility
+                        )
+                        if method_info:
+                            class_info.methods.append(method_info)
+        
+        return class_info
+    
+    def _add_function(
+        self,
+        node,
+        content: bytes,
+        structure: FileStructure,
+        in_anonymous_namespace: bool,
+    ):
+        """Record a file-scope function definition."""
+        # Determine visibility for file-scope functions
+        # Check for static storage class (internal linkage)
+        is_static = any(
+            child.type == "storage_class_specifier" and 
+            self._slice(child, content).strip() == b"static"
+            for child in node.children
+        )
+        
+        if is_static or in_anonymous_namespace:
+            visibility = Visibility.PRIVATE
+        else:
+            visibility = Visibility.PUBLIC
+        
+        func_info = self._extract_function_info(
+            node, content, visibility=visibility
+        )
+        if func_info:
+            structure.functions.append(func_info)
     
     def _extract_function_info(
         self, 
@@ -163,55 +241,56 @@ class CppParser(BaseParser):
         if not name:
             return None
         
-        # Build signature from return type + declarator
+        # Build signature from return type + declarator, decoded once
         type_node = node.child_by_field_name("type")
         if type_node:
-            signature = f"{self._get_text(type_node, content)} {self._get_text(declarator, content)}"
+            signature = self._slice(type_node, content) + b" " + self._slice(declarator, content)
         else:
-            signature = self._get_text(declarator, content)
+            signature = self._slice(declarator, content)
         
         return FunctionInfo(
-            name=name,
-            signature=signature.strip(),
+            name=name.decode("utf-8", errors="replace"),
+            signature=signature.strip().decode("utf-8", errors="replace"),
             line_start=node.start_point[0] + 1,
             line_end=node.end_point[0] + 1,
             visibility=visibility,
         )
     
-    def _find_function_name(self, declarator, content: bytes) -> str | None:
-        """Recursively find function name in declarator."""
-        # Handle both identifier (top-level) and field_identifier (methods)
-        if declarator.type in ["identifier", "field_identifier"]:
-            return self._get_text(declarator, content)
-        
-        if declarator.type == "qualified_identifier":
-            # Get the last part (actual name)
-            name_node = declarator.child_by_field_name("name")
-            if name_node:
-                return self._get_text(name_node, content)
-        
-        if declarator.type == "function_declarator":
-            inner = declarator.child_by_field_name("declarator")
-            if inner:
-                return self._find_function_name(inner, content)
-        
-        # Check children
-        for child in declarator.children:
-            result = self._find_function_name(child, content)
-            if result:
-                return result
+    def _find_function_name(self, declarator, content: bytes) -> bytes | None:
+        """Follow declarator links down to the node that names the function.
+        
+        Returns the name undecoded; callers decode it once kept.
+        """
+        node = declarator
+        while node.type in _WRAPPER_DECLARATORS:
+            # parenthesized_declarator has no field, just the inner node
+            inner = node.child_by_field_name("declarator") or node.named_child(0)
+            if inner is None:
+                return None
+            node = inner
         
+        if node.type == "qualified_identifier":
+            # Drop the outermost scope only, e.g. ns::Class::method -> Class::method
+            name_node = node.child_by_field_name("name")
+            return self._slice(name_node, content) if name_node else None
+        
+        if node.type == "template_function":
+            node = node.child_by_field_name("name")
+        
+        if node is not None and node.type in _NAME_TYPES:
+            return self._slice(node, content)
         return None
     
-    def _find_nodes(self, root, node_type: str):
-        """Find all nodes of a given type."""
-        nodes = []
-        
-        def visit(node):
-            if node.type == node_type:
-                nodes.append(node)
-            for child in node.children:
-                visit(child)
-        
-        visit(root)
-        return nodes
+    def _member_functions(self, node):
+        """Yield function definitions declared by a class body member.
+        
+        Looks through templates, friends and preprocessor conditionals, but
+        not into nested classes or function bodies.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.type == "function_definition":
+                yield node
+            elif node.type in _MEMBER_WRAPPERS:
+                stack.extend(reversed(node.named_children))
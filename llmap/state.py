@@ -1,65 +1,201 @@
 """State file management for incremental updates."""
 
-import json
+import os
+import time
 from dataclasses import dataclass, field
-from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+
+from . import _json
+from .hashing import ALGORITHM, combine_hashes
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+STATE_VERSION = 4
+
+
+class StateError(Exception):
+    """Raised when an existing state file cannot be read."""
+    pass
+
+# State file name per serialization format
+STATE_FILES = {
+    "msgpack": "state.msgpack",
+    "json": "state.json",
+}
+
+
+def state_format() -> str:
+    """Return the state file format to write.
+    
+    MessagePack (JSON only if msgpack is missing); set LLMAP_STATE_FORMAT=json
+    to keep a human-readable state file for debugging.
+    """
+    if msgpack is None or os.environ.get("LLMAP_STATE_FORMAT") == "json":
+        return "json"
+    return "msgpack"
+
+
+def _decode(raw: bytes, fmt: str) -> dict:
+    if fmt == "msgpack":
+        return msgpack.unpackb(raw, raw=False)
+    return _json.loads(raw)
+
+
+def _strip_legacy_prefix(value: str) -> str:
+    """Convert a v1/v2 "algorithm:hex" hash to bare hex.
+    
+    Hashes from a different algorithm than the current one become "", which
+    never matches a fresh hash.
+    """
+    algorithm, _, digest = value.rpartition(":")
+    return digest if algorithm == ALGORITHM else ""
+
+
+def _to_hex(value: str | bytes, algorithm: str | None) -> str:
+    """Convert a stored hash (raw digest in msgpack, hex in JSON) to hex.
+    
+    Like _strip_legacy_prefix, returns "" when algorithm is not ALGORITHM.
+    """
+    if algorithm != ALGORITHM:
+        return ""
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _pack_overview_cache(cache: dict[str, Any], pack) -> dict[str, Any]:
+    """Encode the module hash in an overview cache like every other hash."""
+    if "module_hash" not in cache:
+        return cache
+    return {**cache, "module_hash": pack(cache["module_hash"])}
+
+
+def _encode(data: dict, fmt: str) -> bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return _json.dumps(data, indent=True)
 
 
 @dataclass
 class FileState:
     hash: str
     module: str
+    size: int = 0
+    mtime_ns: int = 0
 
 
 @dataclass
 class ModuleState:
     generated_at: str
     source_hashes: list[str]
+    # Combined digest of source_hashes; equal hashes mean identical sources
+    module_hash: str = ""
+    # Metadata parsed from the module's markdown for overview.md, plus the
+    # module hash the markdown was generated from
+    overview_cache: dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass
 class State:
-    version: int = 1
+    version: int = STATE_VERSION
+    # Algorithm that produced the stored hashes (see llmap.hashing)
+    algorithm: str = ALGORITHM
     last_run: Optional[str] = None
     files: dict[str, FileState] = field(default_factory=dict)
     modules: dict[str, ModuleState] = field(default_factory=dict)
 
 
 class StateManager:
-    """Manages the .codemap/state.json file."""
+    """Manages the .codemap state file (state.msgpack or state.json)."""
     
-    def __init__(self, path: Path):
-        self.path = path
+    def __init__(self, codemap_path: Path):
+        self.format = state_format()
+        self.path = codemap_path / STATE_FILES[self.format]
+        # State file in another format that was loaded, removed on the next
+        # save once its contents are written to self.path
+        self._migrated_path: Optional[Path] = None
+        # Serialized form last read from / written to disk, to skip no-op saves
+        self._saved_bytes: Optional[bytes] = None
         self.state = self._load()
     
     def _load(self) -> State:
-        """Load state from file, or return empty state."""
-        if not self.path.exists():
-            return State()
+        """Load state from file, or return empty state.
+        
+        Raises:
+            StateError: If a MessagePack state file exists but msgpack is not
+                        installed, or the file cannot be decoded
+        """
+        if self.path.exists():
+            path, fmt = self.path, self.format
+        else:
+            # Fall back to a state file written in another format
+            for fmt, name in STATE_FILES.items():
+                path = self.path.with_name(name)
+                if path.exists():
+                    break
+            else:
+                return State()
+        
+        if fmt == "msgpack" and msgpack is None:
+            raise StateError(f"{path} requires msgpack (pip install msgpack)")
         
         try:
-            with open(self.path) as f:
-                data = json.load(f)
-        except (json.JSONDecodeError, IOError):
+            raw = path.read_bytes()
+            data = _decode(raw, fmt)
+        except (ValueError, IOError) as e:
+            if fmt == "msgpack":
+                raise StateError(f"Cannot read {path}: {e}") from e
             return State()
         
+        if path == self.path:
+            self._saved_bytes = raw
+        else:
+            self._migrated_path = path
+        
         state = State(
             version=data.get("version", 1),
             last_run=data.get("last_run"),
         )
         
+        if state.version < 3:
+            # Hashes carried an "algorithm:" prefix
+            to_hex = _strip_legacy_prefix
+        else:
+            to_hex = partial(_to_hex, algorithm=data.get("algorithm"))
+        
         for filepath, file_data in data.get("files", {}).items():
+            file_hash = to_hex(file_data["hash"])
             state.files[filepath] = FileState(
-                hash=file_data["hash"],
+                hash=file_hash,
                 module=file_data["module"],
+                # Without a usable hash, force a rehash on the next run
+                size=file_data.get("size", 0) if file_hash else -1,
+                mtime_ns=file_data.get("mtime_ns", 0),
             )
         
         for module_name, module_data in data.get("modules", {}).items():
+            source_hashes = [to_hex(h) for h in module_data["source_hashes"]]
+            if state.version < 4:
+                # Recompute from the migrated hashes (v3 and earlier used a
+                # different combining function without BLAKE3) so unchanged
+                # modules are not regenerated
+                module_hash = (
+                    combine_hashes(source_hashes) if all(source_hashes) else ""
+                )
+            else:
+                module_hash = to_hex(module_data.get("module_hash", ""))
+            overview_cache = module_data.get("overview_cache", {})
+            if "module_hash" in overview_cache:
+                overview_cache["module_hash"] = to_hex(overview_cache["module_hash"])
             state.modules[module_name] = ModuleState(
                 generated_at=module_data["generated_at"],
-                source_hashes=module_data["source_hashes"],
+                source_hashes=source_hashes,
+                module_hash=module_hash,
+                overview_cache=overview_cache,
             )
         
         return state
@@ -70,46 +206,99 @@ class StateManager:
             return self.state.files[filepath].hash
         return None
     
-    def update(self, files: list[tuple[str, str, str]]):
+    def get_file_state(self, filepath: str) -> Optional[FileState]:
+        """Get the stored state (hash, module, size, mtime) for a file."""
+        return self.state.files.get(filepath)
+    
+    def get_module_hash(self, module_name: str) -> Optional[str]:
+        """Get the stored module hash, if the module has been generated."""
+        if module_name in self.state.modules:
+            return self.state.modules[module_name].module_hash
+        return None
+    
+    def update(
+        self,
+        files: list[tuple[str, str, str]],
+        stats: Optional[dict[str, tuple[int, int]]] = None,
+    ):
         """Update state with new file hashes.
         
         Args:
             files: List of (filepath, hash, module_name) tuples
+            stats: Optional dict mapping filepath to (size, mtime_ns), recorded
+                   so unchanged files can be skipped without hashing next run
         """
-        now = datetime.utcnow().isoformat() + "Z"
+        stats = stats or {}
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
         self.state.last_run = now
         
         # Group by module
         module_hashes: dict[str, list[str]] = {}
         
         for filepath, file_hash, module_name in files:
-            self.state.files[filepath] = FileState(hash=file_hash, module=module_name)
-            
-            if module_name not in module_hashes:
-                module_hashes[module_name] = []
-            module_hashes[module_name].append(file_hash)
+            size, mtime_ns = stats.get(filepath, (0, 0))
+            self.state.files[filepath] = FileState(
+                hash=file_hash,
+                module=module_name,
+                size=size,
+                mtime_ns=mtime_ns,
+            )
+            module_hashes.setdefault(module_name, []).append(file_hash)
         
-        # Update module states
+        # Update module states, keeping those whose sources are unchanged
         for module_name, hashes in module_hashes.items():
+            module_hash = combine_hashes(hashes)
+            existing = self.state.modules.get(module_name)
+            if existing is not None and existing.module_hash == module_hash:
+                continue
             self.state.modules[module_name] = ModuleState(
                 generated_at=now,
                 source_hashes=hashes,
+                module_hash=module_hash,
             )
     
     def save(self):
-        """Save state to file."""
+        """Save state to file atomically, skipping the write if unchanged."""
+        self.state.version = STATE_VERSION
+        self.state.algorithm = ALGORITHM
+        if self.format == "msgpack":
+            # Raw digests take half the space of hex
+            pack = bytes.fromhex
+        else:
+            pack = str
         data = {
             "version": self.state.version,
+            "algorithm": self.state.algorithm,
             "last_run": self.state.last_run,
             "files": {
-                filepath: {"hash": fs.hash, "module": fs.module}
+                filepath: {
+                    "hash": pack(fs.hash),
+                    "module": fs.module,
+                    "size": fs.size,
+                    "mtime_ns": fs.mtime_ns,
+                }
                 for filepath, fs in self.state.files.items()
             },
             "modules": {
-                name: {"generated_at": ms.generated_at, "source_hashes": ms.source_hashes}
+                name: {
+                    "generated_at": ms.generated_at,
+                    "source_hashes": [pack(h) for h in ms.source_hashes],
+                    "module_hash": pack(ms.module_hash),
+                    "overview_cache": _pack_overview_cache(ms.overview_cache, pack),
+                }
                 for name, ms in self.state.modules.items()
             },
         }
         
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=2)
+        raw = _encode(data, self.format)
+        if raw != self._saved_bytes:
+            # Write to a temp file and rename so a crash never leaves a torn file
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_bytes(raw)
+            os.replace(tmp_path, self.path)
+            self._saved_bytes = raw
+        
+        # Drop the state file this state was migrated from
+        if self._migrated_path is not None:
+            self._migrated_path.unlink(missing_ok=True)
+            self._migrated_path = None
@@ -0,0 +1,108 @@
+"""On-disk cache of LLM module summaries, keyed by content hash."""
+
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+CACHE_DIR = ".llmap-cache"
+
+# Oldest entries are evicted once the cache holds more than this many
+MAX_ENTRIES = 4096
+
+
+class SummaryCache:
+    """Stores one markdown summary per key under <codemap>/.llmap-cache/.
+    
+    Entries are sharded by the first two characters of the key
+    (<key[:2]>/<key>.md) and evicted first-in first-out once the cache
+    exceeds max_entries.
+    """
+    
+    def __init__(
+        self,
+        codemap_path: Path,
+        max_entries: int = MAX_ENTRIES,
+        refresh: bool = False,
+    ):
+        """Create a cache.
+        
+        Args:
+            codemap_path: The .codemap directory
+            max_entries: Entry count above which the oldest entries are evicted
+            refresh: Treat every lookup as a miss; new summaries still
+                     replace the stored entries
+        """
+        self.path = codemap_path / CACHE_DIR
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        # Number of entries on disk, counted on first write
+        self._count: Optional[int] = None
+    
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.md"
+    
+    def _entries(self) -> list[Path]:
+        return list(self.path.glob("*/*.md"))
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached summary for key, or None on a miss."""
+        if self.refresh:
+            return None
+        try:
+            return self._entry_path(key).read_text(encoding="utf-8")
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+    
+    def put(self, key: str, content: str) -> None:
+        """Store a summary, evicting the oldest entries if over the bound."""
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        gitignore = self.path / ".gitignore"
+        if not gitignore.exists():
+            gitignore.write_text("*\n")
+        
+        # Write to a temp file and rename so readers never see a partial entry
+        tmp_path = entry_path.with_name(
+            f"{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        tmp_path.write_text(content, encoding="utf-8")
+        
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._entries())
+            if not entry_path.exists():
+                self._count += 1
+            os.replace(tmp_path, entry_path)
+            
+            if self._count > self.max_entries:
+                self._evict()
+    
+    def _evict(self) -> None:
+        """Remove the oldest entries (by mtime).
+        
+        Trims to 90% of max_entries so the directory scan is amortized over
+        many writes rather than repeated on each one.
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        
+        keep = self.max_entries * 9 // 10
+        excess = max(len(entries) - keep, 0)
+        for _, entry in entries[:excess]:
+            entry.unlink(missing_ok=True)
+        self._count = len(entries) - excess
+    
+    def clear(self) -> None:
+        """Remove every cached summary."""
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._count = None